@@ -1,9 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
-import io
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 
 # Import the main analysis service and the Pydantic models
-from app.services.analysis import run_analysis
+from app.services.analysis import run_analysis, explain_report, get_report
 from app.api.models import AnalysisReport, HealthCheck
 
 # An APIRouter is used to keep the API endpoints organized.
@@ -11,26 +10,44 @@ router = APIRouter()
 
 @router.post("/analyze/", response_model=AnalysisReport, tags=["Analysis"])
 async def analyze_logs_endpoint(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    model_name: str = Query("synthetic", enum=["synthetic", "telematics"])
+    model_name: str = Query("synthetic", enum=["synthetic", "telematics"]),
+    defer_explanations: bool = Query(False),
 ):
     """
     This endpoint accepts a vehicle log file (CSV) and performs an anomaly analysis.
 
     - **file**: The CSV log file to be analyzed.
     - **model_name**: The analysis model to use (`synthetic` or `telematics`).
+    - **defer_explanations**: Return the rule-based report as soon as detection finishes and
+      generate the LLM explanations in the background. Poll `/reports/{report_id}` for them.
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV file.")
 
     try:
-        contents = await file.read()
-        file_stream = io.BytesIO(contents)
+        # The analysis service runs parsing and inference in a separate worker process, which
+        # keeps the event loop free for other requests. That process cannot share Starlette's
+        # spooled upload, so it gets its own copy: small uploads (still in memory) are read
+        # into bytes, and larger ones are copied to a temporary file that the worker opens.
+        file.file.seek(0)
 
         # Pass the model_name to the analysis service
-        report = run_analysis(file_stream, file_id=file.filename, model_name=model_name)
-        
-        return report
+        report = await run_analysis(
+            file.file,
+            file_id=file.filename,
+            model_name=model_name,
+            defer_explanations=defer_explanations,
+        )
+        if report.report_id is not None:
+            # Runs after the response has been sent.
+            background_tasks.add_task(explain_report, report.report_id)
+
+        # Serialize the report in one pass with Pydantic's compiled JSON encoder. Returning a
+        # Response directly also skips re-validating every anomaly against `response_model`,
+        # which is still used for the API documentation.
+        return Response(content=report.model_dump_json(), media_type="application/json")
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -38,6 +55,18 @@ async def analyze_logs_endpoint(
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 
+@router.get("/reports/{report_id}", response_model=AnalysisReport, tags=["Analysis"])
+async def get_report_endpoint(report_id: str):
+    """
+    Returns a report created with `defer_explanations`. Its status is 'EXPLAINING' until
+    the LLM explanations are ready, and 'COMPLETED' afterwards.
+    """
+    report = get_report(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Report '{report_id}' not found.")
+    return Response(content=report.model_dump_json(), media_type="application/json")
+
+
 @router.get("/health/", response_model=HealthCheck, tags=["Health"])
 async def health_check():
     """
@@ -17,11 +17,14 @@ class Anomaly(BaseModel):
 # --- Analysis Report Model ---
 # This is the main response model for the /analyze endpoint.
 # It provides a summary of the analysis and a list of all found anomalies.
+# When explanations are deferred, `status` is 'EXPLAINING' and `report_id` identifies the
+# report to poll for until it is 'COMPLETED'.
 class AnalysisReport(BaseModel):
     file_id: str
     status: str
     anomaly_count: int
     anomalies: List[Anomaly]
+    report_id: Optional[str] = None
 
 # --- Health Check Model ---
 # A simple model for the health check endpoint.
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # --- Project Root ---
@@ -6,6 +7,17 @@ from pathlib import Path
 # regardless of where the application is run from.
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
+# --- Upload Configuration ---
+# Uploaded files up to this size (in bytes) are kept in memory; larger uploads are
+# spooled to a temporary file on disk before they are parsed.
+UPLOAD_SPOOL_MAX_SIZE = int(os.getenv("UPLOAD_SPOOL_MAX_SIZE", 1024 * 1024))
+
+# --- Log Format ---
+# Timestamps in uploaded and training logs are ISO-8601 (e.g. '2024-01-01 00:00:00.064').
+# Parsing with an explicit format keeps pandas on its fast C parser instead of
+# inferring a format and falling back to per-row dateutil parsing.
+LOG_TIMESTAMP_FORMAT = "ISO8601"
+
 # --- ML Model Configuration ---
 # This section centralizes the configuration for multiple machine learning models.
 # It allows the application to be flexible and switch between different models.
@@ -38,6 +50,13 @@ MODEL_CONFIGS = {
     }
 }
 
+# Inputs are split into row blocks of at least this many rows and scored in parallel
+# threads; smaller inputs are scored in a single call.
+PARALLEL_INFERENCE_MIN_ROWS = int(os.getenv("PARALLEL_INFERENCE_MIN_ROWS", 50_000))
+
+# Number of worker processes used for the CPU-bound preprocessing and inference stages.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+
 # Define the default model to be loaded on application startup
 DEFAULT_MODEL_NAME = "synthetic"
 
@@ -1,5 +1,11 @@
 from fastapi import FastAPI
+from starlette.formparsers import MultiPartParser
 from app.api.endpoints import router as api_router
+from app.core.config import UPLOAD_SPOOL_MAX_SIZE
+
+# --- Upload Spooling ---
+# Keep small uploads in memory but spill large log files to disk while they are received.
+MultiPartParser.spool_max_size = UPLOAD_SPOOL_MAX_SIZE
 
 # --- Application Initialization ---
 # Create the main FastAPI application instance.
@@ -26,9 +32,10 @@ async def read_root():
     }
 
 # The following is not strictly necessary for the app to run, but it's good practice
-# to confirm that the model loading (which happens on module import) was successful at startup.
+# to load the default model at startup (instead of on the first request) and confirm it succeeded.
 # This is a simple "self-test".
 from app.ml.inference import get_model_artifacts
+from app.services.analysis import shutdown_process_pool
 
 @app.on_event("startup")
 async def startup_event():
@@ -51,5 +58,7 @@ async def startup_event():
 async def shutdown_event():
     """
     This event is triggered when the application shuts down.
+    We use it to stop the analysis worker processes.
     """
+    shutdown_process_pool()
     print("Application shutdown.")
@@ -0,0 +1,55 @@
+import copy
+from typing import Any, Optional
+
+import numpy as np
+
+# --- Fused Scale + Predict ---
+# The Isolation Forest is trained on standardized features, so every split in every tree
+# compares a scaled value against a threshold: (x - mean) / scale <= t.
+# Because the scale is always positive, that is equivalent to x <= t * scale + mean.
+# Folding the scaler into the split thresholds once lets the forest score raw feature
+# values directly, so inference no longer allocates and traverses a scaled copy of the data.
+# Automotive Analogy: This is like baking the sensor calibration curve into the ECU's
+# lookup tables, instead of converting every raw reading before consulting them.
+
+TREE_LEAF = -1
+
+
+def fuse_scaler_into_forest(model: Any, scaler: Any) -> Optional[Any]:
+    """
+    Returns a copy of a fitted tree ensemble whose split thresholds are expressed in raw
+    (unscaled) feature units, so that `fused.predict(X)` equals `model.predict(scaler.transform(X))`.
+
+    Args:
+        model: A fitted tree ensemble such as `IsolationForest`.
+        scaler: The fitted `StandardScaler` that was applied to the training data.
+
+    Returns:
+        The fused model, or None if the model or scaler type is not supported.
+    """
+    if not hasattr(model, "estimators_") or not hasattr(model, "estimators_features_"):
+        return None
+    if not hasattr(scaler, "mean_") or not hasattr(scaler, "scale_"):
+        return None
+    # `mean_` is fitted even with `with_mean=False`, so the flags decide which steps
+    # `transform` applies. Scalers without them are not known to be standard scalers.
+    if not hasattr(scaler, "with_mean") or not hasattr(scaler, "with_std"):
+        return None
+
+    n_features = scaler.n_features_in_
+    mean = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_features)
+
+    fused = copy.deepcopy(model)
+    for estimator, estimator_features in zip(fused.estimators_, fused.estimators_features_):
+        tree = estimator.tree_
+        split_nodes = tree.children_left != TREE_LEAF
+
+        # Tree feature indices refer to the estimator's feature subset, not the full matrix.
+        columns = np.asarray(estimator_features)[tree.feature[split_nodes]]
+
+        # `tree.threshold` is a writable view onto the tree's node array.
+        thresholds = tree.threshold
+        thresholds[split_nodes] = thresholds[split_nodes] * scale[columns] + mean[columns]
+
+    return fused
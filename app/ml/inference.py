@@ -1,49 +1,127 @@
 import joblib
+import os
 import pandas as pd
 import numpy as np
+from functools import lru_cache
+from joblib import Parallel, delayed
 from pathlib import Path
-from typing import Tuple
+from typing import Any, List, Optional, Tuple
 
 # Import the centralized configuration
-from app.core.config import MODEL_PATH, SCALER_PATH, FEATURES, MODEL_CONFIGS, ML_DIR
+from app.core.config import MODEL_CONFIGS, ML_DIR, DEFAULT_MODEL_NAME, PARALLEL_INFERENCE_MIN_ROWS
+from app.ml.fused import fuse_scaler_into_forest
+
+# --- Feature Validation ---
+# Feature sets are built once so each request validates its columns with a single set difference.
+_MODEL_FEATURE_SETS = {name: frozenset(config["features"]) for name, config in MODEL_CONFIGS.items()}
 
 # --- Model Loading ---
-# This section handles loading the pre-trained model and scaler from the disk.
-# This is done once when the module is first imported, making it efficient.
-# The application will not re-load the model for every request.
+# This section handles loading the pre-trained models and scalers from the disk.
+# Artifacts are loaded once per model name and kept in memory by `_load_artifacts`,
+# so the application does not re-load a model for every request.
 # Automotive Analogy: This is the ECU's Power-On Self-Test (POST), where it loads
 # its calibration data from non-volatile memory into active RAM.
 
-model = None
-scaler = None
-
-try:
-    print(f"Loading model from: {MODEL_PATH}")
-    model = joblib.load(MODEL_PATH)
-    print("Model loaded successfully.")
-except FileNotFoundError:
-    print(f"Error: Model file not found at {MODEL_PATH}")
-    model = None # Ensure model is None if loading fails
-
-try:
-    print(f"Loading scaler from: {SCALER_PATH}")
-    scaler = joblib.load(SCALER_PATH)
-    print("Scaler loaded successfully.")
-except FileNotFoundError:
-    print(f"Error: Scaler file not found at {SCALER_PATH}")
-    scaler = None # Ensure scaler is None if loading fails
+@lru_cache(maxsize=None)
+def _load_artifacts(model_name: str) -> Tuple[Any, Any, List[str]]:
+    """
+    Loads and caches the model, scaler, and feature list for a model config.
+
+    Failed loads raise and are therefore not cached, so a model trained after
+    startup is picked up on the next call.
+
+    Args:
+        model_name (str): The name of the model config to load (e.g., 'telematics').
+
+    Returns:
+        Tuple[Any, Any, List[str]]: The model, the scaler, and the ordered feature list.
+    """
+    if model_name not in MODEL_CONFIGS:
+        raise ValueError(f"Model configuration '{model_name}' not found.")
+
+    config = MODEL_CONFIGS[model_name]
+    model_path = ML_DIR / config["model_name"]
+    scaler_path = ML_DIR / config["scaler_name"]
+
+    try:
+        print(f"Loading model from: {model_path}")
+        model_instance = joblib.load(model_path)
+        print(f"Loading scaler from: {scaler_path}")
+        scaler_instance = joblib.load(scaler_path)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"Could not load model/scaler for '{model_name}'. Have you trained it? Details: {e}")
+
+    return model_instance, scaler_instance, config["features"]
+
+@lru_cache(maxsize=None)
+def _load_fused_model(model_name: str) -> Optional[Any]:
+    """
+    Returns the cached model with its scaler folded into the split thresholds,
+    or None if the artifact types do not support fusion.
+    """
+    model_instance, scaler_instance, _ = _load_artifacts(model_name)
+    return fuse_scaler_into_forest(model_instance, scaler_instance)
+
+# --- Inference Threads ---
+# Large inputs are scored by up to this many threads. The analysis service sets it for each
+# task with `set_inference_threads`, so concurrent workers share the cores between them.
+_inference_threads = os.cpu_count() or 1
+
+def set_inference_threads(n_threads: int):
+    """Sets the maximum number of threads used to score a single input (at least 1)."""
+    global _inference_threads
+    _inference_threads = max(1, n_threads)
+
+def _predict_in_chunks(predictor: Any, X: np.ndarray) -> np.ndarray:
+    """
+    Runs `predictor.predict` over row blocks of X in parallel threads for large inputs.
+
+    The tree traversal releases the GIL, so threads scale across cores without copying
+    the feature matrix into worker processes. Small inputs are scored in one call.
+    """
+    n_chunks = min(_inference_threads, len(X) // PARALLEL_INFERENCE_MIN_ROWS)
+    if n_chunks <= 1:
+        return predictor.predict(X)
+
+    chunks = np.array_split(X, n_chunks)
+    results = Parallel(n_jobs=n_chunks, prefer="threads")(delayed(predictor.predict)(chunk) for chunk in chunks)
+    return np.concatenate(results)
+
+def _scale_and_predict(model_name: str, model_instance: Any, scaler_instance: Any, X: np.ndarray) -> np.ndarray:
+    """
+    Scales and scores the feature matrix, using the fused model when available so the
+    data is traversed once and no scaled copy is allocated.
+    """
+    fused_model = _load_fused_model(model_name)
+    if fused_model is not None:
+        return _predict_in_chunks(fused_model, X)
+
+    # X is already a private float32 copy of the features, so it can be scaled in place.
+    X_scaled = scaler_instance.transform(X, copy=False).astype(np.float32, copy=False)
+    return _predict_in_chunks(model_instance, X_scaled)
+
+def _build_feature_matrix(df: pd.DataFrame, features: List[str]) -> np.ndarray:
+    """
+    Copies the model's feature columns, in training order, into a new float32 matrix.
+
+    The trees compare features in float32, so converting here avoids a second
+    float64 -> float32 copy inside scikit-learn and halves the matrix size.
+    A C-contiguous layout keeps each row's features adjacent during tree traversal.
+    Each column is written straight into its slot, so no intermediate sub-frame or
+    column-major copy is built on the way.
+    """
+    X = np.empty((len(df), len(features)), dtype=np.float32)
+    for j, feature in enumerate(features):
+        X[:, j] = df[feature].to_numpy()
+    return X
 
 def get_model_artifacts():
     """
-    Returns the loaded model and scaler.
-    Raises a RuntimeError if artifacts are not loaded.
+    Returns the default model and scaler, loading them through the shared artifact cache.
+    Raises a RuntimeError if artifacts cannot be loaded.
     """
-    if model is None or scaler is None:
-        raise RuntimeError(
-            "Model or scaler artifacts are not loaded. "
-            "Please ensure the training script has been run and the artifacts are in the correct path."
-        )
-    return model, scaler
+    model_instance, scaler_instance, _ = _load_artifacts(DEFAULT_MODEL_NAME)
+    return model_instance, scaler_instance
 
 # --- Prediction Function ---
 def predict_anomalies(df: pd.DataFrame) -> np.ndarray:
@@ -56,27 +134,8 @@ def predict_anomalies(df: pd.DataFrame) -> np.ndarray:
     Returns:
         np.ndarray: An array of predictions. '-1' indicates an anomaly, '1' indicates normal.
     """
-    model_instance, scaler_instance = get_model_artifacts()
-
-    # 1. Ensure the dataframe has the correct features
-    # This is a critical safety check.
-    if not all(feature in df.columns for feature in FEATURES):
-        missing = [f for f in FEATURES if f not in df.columns]
-        raise ValueError(f"Input data is missing required features: {missing}")
-    
-    # 2. Select and reorder features to match the training order
-    X = df[FEATURES]
-
-    # 3. Scale the data using the EXACT SAME scaler from training
-    # Automotive Analogy: This is like converting a raw sensor voltage into a physical
-    # value (e.g., degrees Celsius) using the same calibration curve defined during development.
-    X_scaled = scaler_instance.transform(X)
-
-    # 4. Make predictions
-    # The model returns -1 for anomalies and 1 for normal data points.
-    predictions = model_instance.predict(X_scaled)
-
-    return predictions
+    # The default model shares the keyed artifact cache, so it is only ever loaded once.
+    return predict_anomalies_for_model(df, DEFAULT_MODEL_NAME)
 
 def predict_anomalies_for_model(df: pd.DataFrame, model_name: str) -> np.ndarray:
     """
@@ -89,26 +148,22 @@ def predict_anomalies_for_model(df: pd.DataFrame, model_name: str) -> np.ndarray
     Returns:
         np.ndarray: An array of predictions. '-1' indicates an anomaly, '1' indicates normal.
     """
-    if model_name not in MODEL_CONFIGS:
-        raise ValueError(f"Model configuration '{model_name}' not found.")
+    model_instance, scaler_instance, features = _load_artifacts(model_name)
 
-    config = MODEL_CONFIGS[model_name]
-    model_path = ML_DIR / config["model_name"]
-    scaler_path = ML_DIR / config["scaler_name"]
-    features = config["features"]
-
-    try:
-        model_instance = joblib.load(model_path)
-        scaler_instance = joblib.load(scaler_path)
-    except FileNotFoundError as e:
-        raise RuntimeError(f"Could not load model/scaler for '{model_name}'. Have you trained it? Details: {e}")
-
-    if not all(feature in df.columns for feature in features):
-        missing = [f for f in features if f not in df.columns]
+    # 1. Ensure the dataframe has the correct features
+    # This is a critical safety check.
+    missing = _MODEL_FEATURE_SETS[model_name].difference(df.columns)
+    if missing:
+        missing = [f for f in features if f in missing]
         raise ValueError(f"Input data for model '{model_name}' is missing features: {missing}")
 
-    X = df[features]
-    X_scaled = scaler_instance.transform(X)
-    predictions = model_instance.predict(X_scaled)
+    # 2. Select and reorder features to match the training order
+    X = _build_feature_matrix(df, features)
+
+    # 3. Scale the data using the EXACT SAME scaler from training and make predictions
+    # Automotive Analogy: This is like converting a raw sensor voltage into a physical
+    # value (e.g., degrees Celsius) using the same calibration curve defined during development.
+    # The model returns -1 for anomalies and 1 for normal data points.
+    predictions = _scale_and_predict(model_name, model_instance, scaler_instance, X)
 
     return predictions
@@ -1,5 +1,16 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
-from typing import IO, List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import IO, List, Dict, Any, Optional, Tuple, Union
 import uuid
 
 # --- Import Application Modules ---
@@ -7,10 +18,274 @@ from app.services import preprocessor
 from app.ml import inference
 from app.services import interpreter
 from app.api.models import AnalysisReport, Anomaly
-from app.core.config import MODEL_CONFIGS
-from app.services.llm import generate_explanation_with_llm
+from app.core.config import MODEL_CONFIGS, ANALYSIS_WORKERS, UPLOAD_SPOOL_MAX_SIZE
+from app.services.llm import generate_explanations_bulk
 
-def run_analysis(file: IO, file_id: str = None, model_name: str = "synthetic") -> AnalysisReport:
+# Format of the anomaly timestamps in the report (ISO-8601, second resolution).
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+def _report_values(signal_values: np.ndarray) -> np.ndarray:
+    """
+    Returns the signal values as they should appear in the report and the LLM prompt.
+
+    Features are scored in float32, and widening them to Python floats would print artifacts
+    such as 80.71446228027344 for 80.71446. Each float32 value is therefore converted through
+    its shortest round-trip string, which keeps exactly the precision that was parsed.
+    """
+    if signal_values.dtype != np.float32:
+        return signal_values
+    return signal_values.astype(str).astype(np.float64)
+
+def _load_for_model(file: IO, model_name: str) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Loads and preprocesses the log file for the given model.
+
+    Returns:
+        Tuple[pd.DataFrame, List[str]]: The model-ready DataFrame and its feature list.
+    """
+    if model_name == "telematics":
+        # Telematics pipeline
+        raw_df = preprocessor.load_telematics_data(file)
+        df = preprocessor.preprocess_telematics_data(raw_df)
+        return df, MODEL_CONFIGS['telematics']['features']
+
+    # Default synthetic pipeline
+    df = preprocessor.load_and_prepare_data(file)
+    return df, MODEL_CONFIGS['synthetic']['features']
+
+def _init_worker():
+    """Loads the default model once when a worker process starts, instead of on its first task."""
+    try:
+        inference.get_model_artifacts()
+    except RuntimeError as e:
+        print(f"Worker could not preload model artifacts: {e}")
+
+def _detect_anomalies(source: Union[str, bytes], model_name: str, n_threads: int = 1) -> Dict[str, Any]:
+    """
+    Runs the CPU-bound stages of the analysis (preprocessing and inference) on a log file.
+
+    This runs in a worker process, so only the flagged rows are returned to the caller
+    instead of the full DataFrame.
+
+    Args:
+        source (Union[str, bytes]): The path of the spooled log file, or the contents of a
+            small upload that was kept in memory.
+        model_name (str): The name of the model config to use.
+        n_threads (int): The most threads the model may use to score this log.
+
+    Returns:
+        Dict[str, Any]: Either {'error': message} if preprocessing failed, or the 'features',
+        the anomalous 'signal_values' matrix and their formatted 'timestamps'.
+    """
+    with (io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")) as file:
+        try:
+            df, features = _load_for_model(file, model_name)
+        except ValueError as e:
+            return {"error": str(e)}
+
+    inference.set_inference_threads(n_threads)
+    predictions = inference.predict_anomalies_for_model(df, model_name)
+
+    # Work on the positions of the flagged rows and slice plain arrays, rather than
+    # building a filtered copy of the whole DataFrame.
+    anomaly_idx = np.flatnonzero(predictions == -1)
+
+    # Pull the signal values and timestamps out as plain arrays once, so the report
+    # builds dicts from array slices instead of materializing a pandas Series per row.
+    signal_values = df[features].to_numpy()[anomaly_idx]
+    # Timestamps are formatted as ISO-8601 strings in a single vectorized call. Missing
+    # timestamps format as NaN, so they are reported as "NaT", like str() of a NaT would.
+    timestamps = (
+        pd.to_datetime(df['timestamp'].iloc[anomaly_idx])
+        .dt.strftime(TIMESTAMP_FORMAT)
+        .fillna("NaT")
+        .to_numpy()
+    )
+
+    return {"features": features, "signal_values": signal_values, "timestamps": timestamps}
+
+# --- Upload Copy Buffers ---
+# Uploads are copied to disk through a small pool of reusable buffers, so concurrent
+# requests do not allocate (and the GC does not reclaim) a fresh chunk for every read.
+COPY_BUFFER_SIZE = 1024 * 1024
+COPY_BUFFER_POOL_SIZE = 8
+
+_copy_buffers: "queue.Queue[bytearray]" = queue.Queue(maxsize=COPY_BUFFER_POOL_SIZE)
+
+def _read_small_upload(file: IO) -> Optional[bytes]:
+    """
+    Returns the rest of the upload as bytes if it is small enough to have been kept in
+    memory (at most UPLOAD_SPOOL_MAX_SIZE bytes), or None if it should be spooled to disk.
+    """
+    start = file.tell()
+    size = file.seek(0, io.SEEK_END) - start
+    file.seek(start)
+    if size > UPLOAD_SPOOL_MAX_SIZE:
+        return None
+    return file.read()
+
+def _spool_to_disk(file: IO) -> str:
+    """Streams the upload into a named temporary file that a worker process can open."""
+    # SpooledTemporaryFile only gained readinto() in Python 3.11; on older versions read
+    # through the file object it wraps (a BytesIO or a real temporary file), which shares
+    # its position.
+    readinto = getattr(file, "readinto", None) or getattr(getattr(file, "_file", None), "readinto", None)
+
+    try:
+        buffer = _copy_buffers.get_nowait()
+    except queue.Empty:
+        buffer = bytearray(COPY_BUFFER_SIZE)
+
+    spooled = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+    try:
+        with spooled:
+            if readinto is None:
+                shutil.copyfileobj(file, spooled, COPY_BUFFER_SIZE)
+            else:
+                view = memoryview(buffer)
+                while True:
+                    n_read = readinto(view)
+                    if not n_read:
+                        break
+                    spooled.write(view[:n_read])
+    except BaseException:
+        # Nothing will remove a partial copy later, so remove it here.
+        os.unlink(spooled.name)
+        raise
+    finally:
+        try:
+            _copy_buffers.put_nowait(buffer)
+        except queue.Full:
+            pass
+
+    return spooled.name
+
+# --- Process Pool ---
+# Preprocessing and inference are CPU-bound, so they run in worker processes to use all
+# cores and keep the GIL free for the event loop. The pool is created on first use.
+_process_pool = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _process_pool
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    """
+    Drops a pool whose worker died (e.g. killed by the OOM killer), so the next call to
+    `_get_process_pool` starts a fresh one. A broken pool rejects every later task.
+    """
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False)
+
+# --- Scoring Threads ---
+# Each detection may score its log in several threads. The cores are split between the
+# detections in flight when it starts, so a lone large upload uses every core while
+# concurrent uploads fall back to about one thread each instead of N threads per worker.
+# The event loop runs in a single thread, so a plain counter is enough.
+_active_detections = 0
+
+def _scoring_thread_budget() -> int:
+    """Returns the number of scoring threads for a detection that is starting now."""
+    return max(1, (os.cpu_count() or 1) // max(1, _active_detections))
+
+async def _run_detection(source: Union[str, bytes], model_name: str) -> Dict[str, Any]:
+    """Runs `_detect_anomalies` in the process pool, retrying once on a fresh pool if it broke."""
+    global _active_detections
+    loop = asyncio.get_running_loop()
+    _active_detections += 1
+    try:
+        for attempt in range(2):
+            pool = _get_process_pool()
+            try:
+                return await loop.run_in_executor(
+                    pool, _detect_anomalies, source, model_name, _scoring_thread_budget()
+                )
+            except BrokenProcessPool:
+                _discard_process_pool(pool)
+                if attempt:
+                    raise
+                print("Analysis worker pool broke; retrying on a new pool.")
+    finally:
+        _active_detections -= 1
+
+def shutdown_process_pool():
+    """Stops the analysis worker processes, if they were started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown()
+        _process_pool = None
+
+def _build_anomalies(
+    file_id: str,
+    anomaly_contexts: List[Dict[str, Any]],
+    llm_results: List[Any],
+) -> List[Anomaly]:
+    """
+    Builds the report's anomalies from their contexts and LLM explanations, falling back to
+    the rule-based interpretation wherever the LLM gave no (or a failed) explanation.
+    """
+    anomaly_list: List[Anomaly] = []
+    for i, (context, llm_result) in enumerate(zip(anomaly_contexts, llm_results)):
+        # The interpreter might need to be adapted if rules are different for telematics
+        interpretation = {"severity": context["rule_based_severity"], "explanation": context["rule_based_explanation"]}
+        if isinstance(llm_result, Exception):
+            print(f"[{file_id}] LLM explanation failed for anomaly {i}: {llm_result}")
+            llm_result = {}
+
+        llm_root_cause = llm_result.get("root_cause")
+        llm_severity = llm_result.get("severity") or interpretation["severity"]
+        llm_recommended_actions = llm_result.get("recommended_actions") or []
+        if isinstance(llm_recommended_actions, str):
+            llm_recommended_actions = [llm_recommended_actions]
+
+        final_explanation = llm_root_cause or interpretation["explanation"]
+        final_severity = str(llm_severity or interpretation["severity"]).upper()
+
+        # The model is constructed without re-running Pydantic validation, so every field is
+        # coerced to its declared type here: timestamps, LLM output and NumPy scalars are
+        # not guaranteed to arrive as plain strings and floats.
+        anomaly = Anomaly.model_construct(
+            timestamp=str(context["timestamp"]),
+            severity=final_severity,
+            explanation=str(final_explanation),
+            contributing_signals={str(name): float(value) for name, value in context["sensor_values"].items()},
+            root_cause=str(llm_root_cause) if llm_root_cause else None,
+            recommended_actions=[str(action) for action in llm_recommended_actions],
+        )
+        anomaly_list.append(anomaly)
+
+    return anomaly_list
+
+# --- Deferred Explanation Store ---
+# Reports returned before their LLM explanations are ready are kept in memory so clients
+# can poll for the completed version. The oldest reports are evicted once the store is full.
+REPORT_STORE_MAX_SIZE = 256
+
+_report_store: "OrderedDict[str, AnalysisReport]" = OrderedDict()
+_pending_contexts: Dict[str, List[Dict[str, Any]]] = {}
+
+def _store_report(report: AnalysisReport, anomaly_contexts: List[Dict[str, Any]]):
+    """Stores a report awaiting its explanations, evicting the oldest report when full."""
+    _report_store[report.report_id] = report
+    _pending_contexts[report.report_id] = anomaly_contexts
+    while len(_report_store) > REPORT_STORE_MAX_SIZE:
+        evicted_id, _ = _report_store.popitem(last=False)
+        _pending_contexts.pop(evicted_id, None)
+
+async def run_analysis(
+    file: IO,
+    file_id: str = None,
+    model_name: str = "synthetic",
+    defer_explanations: bool = False,
+) -> AnalysisReport:
     """
     The main orchestration function for running a complete vehicle log analysis.
 
@@ -18,78 +293,99 @@ def run_analysis(file: IO, file_id: str = None, model_name: str = "synthetic") -
         file (IO): The file-like object containing the log data.
         file_id (str, optional): A unique identifier for the file.
         model_name (str, optional): The name of the model to use ('synthetic' or 'telematics').
+        defer_explanations (bool, optional): If True, return the rule-based report right after
+            detection with status 'EXPLAINING' and a `report_id`. The caller then schedules
+            `explain_report(report_id)` to fill in the LLM explanations.
 
     Returns:
         AnalysisReport: A Pydantic model containing the full analysis report.
+
+    Note:
+        Preprocessing and inference are synchronous and CPU-bound, so they run in a worker
+        process. The LLM explanations for all anomalies are then requested concurrently.
     """
     if file_id is None:
         file_id = str(uuid.uuid4())
 
-    print(f"[{file_id}] Starting analysis with model '{model_name}'... Step 1: Preprocessing.")
-    
-    try:
-        if model_name == "telematics":
-            # Telematics pipeline
-            raw_df = preprocessor.load_telematics_data(file)
-            df = preprocessor.preprocess_telematics_data(raw_df)
-            features = MODEL_CONFIGS['telematics']['features']
-        else:
-            # Default synthetic pipeline
-            df = preprocessor.load_and_prepare_data(file)
-            features = MODEL_CONFIGS['synthetic']['features']
-
-    except ValueError as e:
+    print(f"[{file_id}] Starting analysis with model '{model_name}'... Step 1 & 2: Preprocessing and ML inference.")
+
+    # Small uploads are still in memory and are sent to the worker as bytes; only large
+    # uploads are written to a file the worker can open.
+    content = await asyncio.to_thread(_read_small_upload, file)
+    if content is not None:
+        detection = await _run_detection(content, model_name)
+    else:
+        path = await asyncio.to_thread(_spool_to_disk, file)
+        try:
+            detection = await _run_detection(path, model_name)
+        finally:
+            os.remove(path)
+
+    if "error" in detection:
         return AnalysisReport(
             file_id=file_id,
             status="FAILED_PREPROCESSING",
-            error_message=str(e),
+            error_message=detection["error"],
             anomaly_count=0,
             anomalies=[]
         )
 
-    print(f"[{file_id}] Step 2: Running ML inference...")
-    if model_name == "telematics":
-        predictions = inference.predict_anomalies_for_model(df, model_name="telematics")
-    else:
-        predictions = inference.predict_anomalies(df)
-    
-    df['anomaly_flag'] = predictions
+    features = detection["features"]
+    signal_values = detection["signal_values"]
+    timestamps = detection["timestamps"]
+
+    # Healthy logs are the common case: with nothing flagged there is nothing to
+    # interpret or explain, so return before any interpretation or LLM work.
+    if len(signal_values) == 0:
+        print(f"[{file_id}] No anomalies detected. Analysis complete.")
+        return AnalysisReport(
+            file_id=file_id,
+            status="COMPLETED",
+            anomaly_count=0,
+            anomalies=[]
+        )
 
-    anomalous_data = df[df['anomaly_flag'] == -1]
-    print(f"[{file_id}] Step 3: Interpreting {len(anomalous_data)} detected anomalies...")
+    print(f"[{file_id}] Step 3: Interpreting {len(signal_values)} detected anomalies...")
 
-    anomaly_list: List[Anomaly] = []
-    for _, row in anomalous_data.iterrows():
-        # The interpreter might need to be adapted if rules are different for telematics
-        interpretation = interpreter.interpret_anomaly(row, feature_list=features)
-
-        # Build context for the LLM and fetch a structured explanation.
-        anomaly_context = {
-            "sensor_values": row[features].to_dict(),
-            "anomaly_score": float(row.get("anomaly_flag", -1)) if "anomaly_flag" in row else -1,
-            "timestamp": str(row.get("timestamp")),
-            "feature_name": ",".join(features),
-            "rule_based_severity": interpretation["severity"],
-            "rule_based_explanation": interpretation["explanation"],
-        }
-
-        llm_result = generate_explanation_with_llm(anomaly_context)
-        llm_root_cause = llm_result.get("root_cause")
-        llm_severity = llm_result.get("severity") or interpretation["severity"]
-        llm_recommended_actions = llm_result.get("recommended_actions") or []
+    # Classify every anomaly in one vectorized pass instead of interpreting row by row.
+    severities, explanations = interpreter.interpret_anomalies_vectorized(signal_values, feature_list=features)
 
-        final_explanation = llm_root_cause or interpretation["explanation"]
-        final_severity = (llm_severity or interpretation["severity"]).upper()
-        
-        anomaly = Anomaly(
-            timestamp=str(row['timestamp']),
-            severity=final_severity,
-            explanation=final_explanation,
-            contributing_signals=row[features].to_dict(),
-            root_cause=llm_root_cause,
-            recommended_actions=llm_recommended_actions,
+    feature_names = list(features)
+    feature_name_str = ",".join(feature_names)
+
+    report_values = _report_values(signal_values)
+    contributing_signals_list: List[Dict[str, Any]] = []
+    anomaly_contexts: List[Dict[str, Any]] = []
+    for i in range(len(signal_values)):
+        contributing_signals_list.append(dict(zip(feature_names, report_values[i].tolist())))
+
+        # Build context for the LLM explanation of this anomaly.
+        anomaly_contexts.append({
+            "sensor_values": contributing_signals_list[i],
+            "anomaly_score": -1.0,
+            "timestamp": timestamps[i],
+            "feature_name": feature_name_str,
+            "rule_based_severity": str(severities[i]),
+            "rule_based_explanation": str(explanations[i]),
+        })
+
+    if defer_explanations:
+        # Return the rule-based report now; `explain_report` fills in the LLM explanations
+        # later and the client polls `get_report` for the finished report.
+        report = AnalysisReport(
+            file_id=file_id,
+            status="EXPLAINING",
+            anomaly_count=len(anomaly_contexts),
+            anomalies=_build_anomalies(file_id, anomaly_contexts, [{}] * len(anomaly_contexts)),
+            report_id=str(uuid.uuid4()),
         )
-        anomaly_list.append(anomaly)
+        _store_report(report, anomaly_contexts)
+        print(f"[{file_id}] Detection complete. LLM explanations deferred to report {report.report_id}.")
+        return report
+
+    # Explanations for all anomalies are fetched concurrently in one bulk call.
+    llm_results = await generate_explanations_bulk(anomaly_contexts)
+    anomaly_list = _build_anomalies(file_id, anomaly_contexts, llm_results)
 
     print(f"[{file_id}] Analysis complete. Generating final report.")
     report = AnalysisReport(
@@ -100,3 +396,41 @@ def run_analysis(file: IO, file_id: str = None, model_name: str = "synthetic") -
     )
 
     return report
+
+async def explain_report(report_id: str):
+    """
+    Generates the LLM explanations for a report returned with deferred explanations,
+    and replaces the stored report with the completed one.
+
+    Args:
+        report_id (str): The ID of a report created by `run_analysis(..., defer_explanations=True)`.
+    """
+    anomaly_contexts = _pending_contexts.pop(report_id, None)
+    report = _report_store.get(report_id)
+    if anomaly_contexts is None or report is None:
+        return
+
+    try:
+        llm_results = await generate_explanations_bulk(anomaly_contexts)
+        anomaly_list = _build_anomalies(report.file_id, anomaly_contexts, llm_results)
+        completed = AnalysisReport(
+            file_id=report.file_id,
+            status="COMPLETED",
+            anomaly_count=len(anomaly_list),
+            anomalies=anomaly_list,
+            report_id=report_id,
+        )
+    except Exception as e:
+        # Finish with the rule-based explanations the report already holds, so clients
+        # polling for it do not wait on an 'EXPLAINING' report forever.
+        print(f"[{report.file_id}] LLM explanations for report {report_id} failed: {e}")
+        completed = report.model_copy(update={"status": "COMPLETED"})
+
+    # The report may have been evicted while its explanations were being generated.
+    if report_id in _report_store:
+        _report_store[report_id] = completed
+    print(f"[{report.file_id}] LLM explanations for report {report_id} complete.")
+
+def get_report(report_id: str) -> Optional[AnalysisReport]:
+    """Returns a stored report by ID, or None if it is unknown or has been evicted."""
+    return _report_store.get(report_id)
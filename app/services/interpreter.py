@@ -1,5 +1,38 @@
 import pandas as pd
-from typing import Dict, Any, List
+import numpy as np
+from typing import Dict, Any, List, Tuple
+
+# --- Rule Explanations ---
+# Shared by the per-row and the vectorized interpreter so both always report the same text.
+OVERHEATING_HIGH_EXPLANATION = "Critical Overheating Detected: Engine temperature is dangerously high at low vehicle speed. Suspect cooling system failure."
+OVERHEATING_MEDIUM_EXPLANATION = "Engine Temperature Anomaly: Engine is running hotter than normal for the current vehicle speed."
+CHARGING_HIGH_EXPLANATION = "Charging System Fault: Battery voltage is critically low while the vehicle is in motion. Suspect alternator failure."
+CHARGING_MEDIUM_EXPLANATION = "Low Battery Voltage: Battery voltage is below the normal operating range."
+BRAKE_HIGH_EXPLANATION = "Brake System Anomaly: High brake pressure detected at highway speeds without significant deceleration."
+GENERIC_EXPLANATION = "General Anomaly Detected: The model identified an unusual combination of sensor readings that deviates from normal operation."
+
+# --- Vectorized Rule Tables ---
+# The rules in priority order, matching the early returns in `interpret_anomaly`.
+# `interpret_anomalies_vectorized` packs one bit per rule (first rule = highest bit) into
+# a condition code per row; these tables map every possible code to the first matching rule.
+PRIORITIZED_RULES = [
+    ("HIGH", OVERHEATING_HIGH_EXPLANATION),
+    ("MEDIUM", OVERHEATING_MEDIUM_EXPLANATION),
+    ("HIGH", CHARGING_HIGH_EXPLANATION),
+    ("MEDIUM", CHARGING_MEDIUM_EXPLANATION),
+    ("HIGH", BRAKE_HIGH_EXPLANATION),
+]
+
+def _build_rule_tables():
+    n_rules = len(PRIORITIZED_RULES)
+    severities = np.full(2 ** n_rules, "LOW", dtype=object)
+    explanations = np.full(2 ** n_rules, GENERIC_EXPLANATION, dtype=object)
+    for code in range(1, 2 ** n_rules):
+        first_rule = next(k for k in range(n_rules) if code & (1 << (n_rules - 1 - k)))
+        severities[code], explanations[code] = PRIORITIZED_RULES[first_rule]
+    return severities, explanations
+
+SEVERITY_LUT, EXPLANATION_LUT = _build_rule_tables()
 
 def interpret_anomaly(row: pd.Series, feature_list: List[str]) -> Dict[str, Any]:
     """
@@ -30,12 +63,12 @@ def interpret_anomaly(row: pd.Series, feature_list: List[str]) -> Dict[str, Any]
         if engine_temp > 105 and vehicle_speed < 20:
             return {
                 "severity": "HIGH",
-                "explanation": "Critical Overheating Detected: Engine temperature is dangerously high at low vehicle speed. Suspect cooling system failure."
+                "explanation": OVERHEATING_HIGH_EXPLANATION
             }
         if engine_temp > 100 and vehicle_speed < 40:
             return {
                 "severity": "MEDIUM",
-                "explanation": "Engine Temperature Anomaly: Engine is running hotter than normal for the current vehicle speed."
+                "explanation": OVERHEATING_MEDIUM_EXPLANATION
             }
 
     # --- Rule 2: Alternator/Battery Failure ---
@@ -43,12 +76,12 @@ def interpret_anomaly(row: pd.Series, feature_list: List[str]) -> Dict[str, Any]
         if battery_voltage < 12.0 and vehicle_speed > 10:
             return {
                 "severity": "HIGH",
-                "explanation": "Charging System Fault: Battery voltage is critically low while the vehicle is in motion. Suspect alternator failure."
+                "explanation": CHARGING_HIGH_EXPLANATION
             }
         if battery_voltage < 12.2:
             return {
                 "severity": "MEDIUM",
-                "explanation": "Low Battery Voltage: Battery voltage is below the normal operating range."
+                "explanation": CHARGING_MEDIUM_EXPLANATION
             }
 
     # --- Rule 3: Unintended Braking / Brake System Fault ---
@@ -56,11 +89,77 @@ def interpret_anomaly(row: pd.Series, feature_list: List[str]) -> Dict[str, Any]
         if brake_pressure > 50 and vehicle_speed > 80:
             return {
                 "severity": "HIGH",
-                "explanation": "Brake System Anomaly: High brake pressure detected at highway speeds without significant deceleration."
+                "explanation": BRAKE_HIGH_EXPLANATION
             }
 
     # --- Generic / Fallback Rule ---
     return {
         "severity": "LOW",
-        "explanation": "General Anomaly Detected: The model identified an unusual combination of sensor readings that deviates from normal operation."
+        "explanation": GENERIC_EXPLANATION
     }
+
+
+def interpret_anomalies_vectorized(signal_values: np.ndarray, feature_list: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Interprets every anomalous row of a feature matrix in a single vectorized pass.
+
+    Applies the same rules, in the same priority order, as `interpret_anomaly`, but
+    evaluates them as boolean masks over whole columns, packs them into one condition
+    code per row, and resolves severity and explanation with a table lookup.
+
+    Args:
+        signal_values (np.ndarray): A 2D array of anomalous rows, with one column per feature.
+        feature_list (List[str]): The feature names, in the same order as the columns of `signal_values`.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The severity and explanation arrays, aligned with the rows of `signal_values`.
+    """
+
+    # Define a helper to check for a feature's existence and get its column values
+    def get_feature(name_options):
+        for name in name_options:
+            if name in feature_list:
+                return signal_values[:, feature_list.index(name)]
+        return None
+
+    engine_temp = get_feature(['engine_temp', 'engine_coolant_temperature'])
+    vehicle_speed = get_feature(['vehicle_speed'])
+    battery_voltage = get_feature(['battery_voltage', 'control_module_voltage'])
+    brake_pressure = get_feature(['brake_pressure'])
+
+    # Each rule sets one bit of a per-row condition code. Bits are assigned in the
+    # priority order of the early returns in `interpret_anomaly` (highest bit first), and
+    # the lookup tables map every code to the first matching rule.
+    n_rows = len(signal_values)
+    code = np.zeros(n_rows, dtype=np.uint8)
+
+    def set_rule_bit(mask, bit):
+        # Boolean masks are one byte of 0/1 per row, so they are reinterpreted as uint8
+        # (no copy) and shifted into the code in place.
+        np.bitwise_or(code, mask.view(np.uint8) << bit, out=code)
+
+    # --- Rule 1: Engine Overheating Fault ---
+    if engine_temp is not None and vehicle_speed is not None:
+        mask = engine_temp > 105
+        mask &= vehicle_speed < 20
+        set_rule_bit(mask, 4)
+        mask = engine_temp > 100
+        mask &= vehicle_speed < 40
+        set_rule_bit(mask, 3)
+
+    # --- Rule 2: Alternator/Battery Failure ---
+    if battery_voltage is not None and vehicle_speed is not None:
+        mask = battery_voltage < 12.0
+        mask &= vehicle_speed > 10
+        set_rule_bit(mask, 2)
+        set_rule_bit(battery_voltage < 12.2, 1)
+
+    # --- Rule 3: Unintended Braking / Brake System Fault ---
+    if brake_pressure is not None and vehicle_speed is not None:
+        mask = brake_pressure > 50
+        mask &= vehicle_speed > 80
+        set_rule_bit(mask, 0)
+
+    # --- Generic / Fallback Rule ---
+    # Code 0 (no rule matched) maps to the generic LOW severity explanation.
+    return SEVERITY_LUT[code], EXPLANATION_LUT[code]
@@ -1,32 +1,157 @@
+import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List
+import random
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
 
 logger = logging.getLogger(__name__)
 
+# --- Concurrency Limits ---
+# Caps the number of in-flight OpenAI requests across all uploads and bounds how long a
+# single request may take, so one large log cannot exhaust rate limits or stall a report.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 5.0))
 
-def _extract_json_block(text: str) -> str:
-    """Strip markdown fences (```json ... ```) if the model includes them."""
-    if "```" not in text:
-        return text
+# Rate-limited (HTTP 429) and transient server/connection failures are retried here with
+# jittered exponential backoff, so clients are created with the SDK's own retries disabled.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_SECONDS = 0.5
 
-    segments = text.split("```")
-    if len(segments) < 2:
-        return text
+_RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
 
-    candidate = segments[1]
-    if candidate.lower().startswith("json"):
-        candidate = candidate[4:]
-    return candidate.strip()
+_llm_semaphore = None
 
 
-def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str, Any]:
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """Create the semaphore lazily so it is bound to the running event loop (Python 3.9)."""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_semaphore
+
+
+@lru_cache(maxsize=1)
+def _get_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return the shared OpenAI client for an API key.
+
+    Building a client sets up a new connection pool and TLS context, which is slow and
+    runs synchronously on the event loop. Reusing one client keeps connections alive
+    across requests. A changed key gets a new client.
+    """
+    return AsyncOpenAI(api_key=api_key, max_retries=0)
+
+# --- Prompt ---
+# The instructions are sent as an identical system message on every request and the
+# per-anomaly JSON follows as the user message, so the provider can serve the shared
+# prefix from its prompt cache. Keep this text (and the model/temperature) stable.
+SYSTEM_PROMPT = (
+    "You are an expert automotive diagnostics assistant. Given the anomaly context "
+    "supplied as JSON by the user, provide:\n"
+    "1) A concise root cause hypothesis.\n"
+    "2) Severity category as one of Low, Medium, or High.\n"
+    "3) 2-3 recommended actions a vehicle technician can take next.\n\n"
+    "Respond ONLY with valid JSON using keys: root_cause (string), severity (Low|Medium|High), "
+    "recommended_actions (array of strings)."
+)
+
+# --- Explanation Cache ---
+# Anomalies in a log tend to cluster around the same sensor signature, so successful
+# explanations are kept in an in-process LRU cache keyed by `explanation_cache_key`.
+# Entries expire after `LLM_CACHE_TTL_SECONDS` so prompt or model changes age out.
+LLM_CACHE_MAX_SIZE = 4096
+LLM_CACHE_DECIMALS = 1
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+
+# Maps cache key -> (expiry time on the monotonic clock, explanation).
+_explanation_cache: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def explanation_cache_key(anomaly_context: Dict[str, Any]) -> Tuple:
+    """
+    Build the cache key for an anomaly context.
+
+    The key is the model's feature set, the sensor values rounded to `LLM_CACHE_DECIMALS`,
+    and the rule-based severity. Contexts that share a key get the same explanation.
+    """
+    sensor_values = anomaly_context.get("sensor_values", {})
+    quantized = frozenset((name, round(float(value), LLM_CACHE_DECIMALS)) for name, value in sensor_values.items())
+    return (
+        anomaly_context.get("feature_name"),
+        quantized,
+        anomaly_context.get("rule_based_severity"),
+    )
+
+
+def _get_cached_explanation(cache_key: Tuple) -> Optional[Dict[str, Any]]:
+    """Return a copy of the cached explanation for a key, or None if missing or expired."""
+    entry = _explanation_cache.get(cache_key)
+    if entry is None:
+        return None
+
+    expires_at, explanation = entry
+    if expires_at <= time.monotonic():
+        del _explanation_cache[cache_key]
+        return None
+
+    _explanation_cache.move_to_end(cache_key)
+    return _copy_explanation(explanation)
+
+
+def _store_explanation(cache_key: Tuple, explanation: Dict[str, Any]) -> None:
+    """Cache an explanation, evicting the least recently used entry when full."""
+    _explanation_cache[cache_key] = (time.monotonic() + LLM_CACHE_TTL_SECONDS, explanation)
+    _explanation_cache.move_to_end(cache_key)
+    if len(_explanation_cache) > LLM_CACHE_MAX_SIZE:
+        _explanation_cache.popitem(last=False)
+
+
+def _copy_explanation(explanation: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy so callers cannot mutate a cached explanation."""
+    return {**explanation, "recommended_actions": list(explanation["recommended_actions"])}
+
+
+async def _create_completion(client: AsyncOpenAI, messages: List[Dict[str, str]]) -> Any:
+    """
+    Send one chat completion request under the shared concurrency limit.
+
+    A rate-limited request gives up its semaphore slot while it backs off, so other
+    requests keep going. The last error is re-raised once retries are exhausted.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with _get_llm_semaphore():
+                return await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=messages,
+                        temperature=0.1,
+                        response_format={"type": "json_object"},
+                    ),
+                    timeout=LLM_TIMEOUT_SECONDS,
+                )
+        except _RETRYABLE_ERRORS:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = LLM_BACKOFF_SECONDS * (2 ** attempt)
+            delay += random.uniform(0, delay)
+            logger.warning("LLM request failed; retrying in %.2f seconds.", delay)
+            await asyncio.sleep(delay)
+
+
+async def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str, Any]:
     """
     Generate a structured, human-readable anomaly explanation using OpenAI ChatCompletion.
 
+    This is a coroutine so that the explanations for many anomalies can be requested
+    concurrently (e.g., with `asyncio.gather`) instead of one blocking call at a time.
+
     Args:
         anomaly_context (Dict[str, Any]): Context containing sensor values, anomaly score, timestamp, and feature name.
 
@@ -34,7 +159,7 @@ def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str,
         Dict[str, Any]: Dictionary with keys 'root_cause', 'severity', and 'recommended_actions'.
 
     Note:
-        FastAPI integration: Call this function inside your anomaly detection route and merge the returned
+        FastAPI integration: Await this function inside your anomaly detection route and merge the returned
         dictionary into the response payload for each detected anomaly.
     """
     api_key = os.getenv("OPENAI_API_KEY")
@@ -46,7 +171,12 @@ def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str,
             "recommended_actions": ["Configure OPENAI_API_KEY and retry LLM explanation generation."]
         }
 
-    client = OpenAI(api_key=api_key)
+    cache_key = explanation_cache_key(anomaly_context)
+    cached = _get_cached_explanation(cache_key)
+    if cached is not None:
+        return cached
+
+    client = _get_client(api_key)
 
     fallback_response = {
         "root_cause": "Automatic explanation unavailable. Refer to raw anomaly context.",
@@ -54,35 +184,22 @@ def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str,
         "recommended_actions": ["Review the anomaly context and rerun explanation generation later."]
     }
 
-    # Sample prompt sent to the model; kept explicit for observability.
-    prompt = (
-        "You are an automotive diagnostics assistant. Given the anomaly context, provide:\n"
-        "1) A concise root cause hypothesis.\n"
-        "2) Severity category as one of Low, Medium, or High.\n"
-        "3) 2-3 recommended actions a vehicle technician can take next.\n\n"
-        "Respond ONLY with valid JSON using keys: root_cause (string), severity (Low|Medium|High), "
-        "recommended_actions (array of strings).\n\n"
-        f"Anomaly context:\n{json.dumps(anomaly_context, indent=2)}"
-    )
-
+    # Only the anomaly context varies between requests; the instructions are a fixed prefix.
     messages = [
-        {
-            "role": "system",
-            "content": "You are an expert vehicle diagnostics assistant. Return structured JSON only."
-        },
-        {"role": "user", "content": prompt},
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": json.dumps(anomaly_context)},
     ]
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.1,
-            response_format={"type": "json_object"},
-        )
+        completion = await _create_completion(client, messages)
+        usage = getattr(completion, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None:
+            logger.debug("LLM prompt tokens: %s (cached: %s)", usage.prompt_tokens, details.cached_tokens)
+
         content = completion.choices[0].message.content
-        cleaned = _extract_json_block(content).strip()
-        parsed = json.loads(cleaned)
+        # JSON mode guarantees the content is a JSON object, so it is parsed as-is.
+        parsed = json.loads(content)
 
         root_cause = str(parsed.get("root_cause", "")).strip() or fallback_response["root_cause"]
         severity = str(parsed.get("severity", "Medium")).capitalize()
@@ -99,15 +216,53 @@ def generate_explanation_with_llm(anomaly_context: Dict[str, Any]) -> Dict[str,
         if not recommended_actions:
             recommended_actions = fallback_response["recommended_actions"]
 
-        return {
+        explanation = {
             "root_cause": root_cause,
             "severity": severity,
             "recommended_actions": recommended_actions,
         }
 
+        # Only successful explanations are cached; failures are retried on the next request.
+        _store_explanation(cache_key, explanation)
+
+        return _copy_explanation(explanation)
+
+    except asyncio.TimeoutError:
+        logger.warning("LLM explanation timed out after %.1f seconds.", LLM_TIMEOUT_SECONDS)
     except json.JSONDecodeError as exc:
         logger.warning("Failed to parse LLM JSON response: %s", exc)
     except Exception as exc:
         logger.exception("LLM explanation generation failed: %s", exc)
 
     return fallback_response
+
+
+async def generate_explanations_bulk(
+    anomaly_contexts: List[Dict[str, Any]],
+) -> List[Union[Dict[str, Any], BaseException]]:
+    """
+    Generate explanations for all anomalies of a report concurrently.
+
+    Contexts that share an `explanation_cache_key` get the same explanation, so only the
+    first context per key is sent. All requests are bounded by the module-wide
+    concurrency limit.
+
+    Args:
+        anomaly_contexts (List[Dict[str, Any]]): One context per anomaly, as accepted by
+            `generate_explanation_with_llm`.
+
+    Returns:
+        List[Union[Dict[str, Any], BaseException]]: One explanation per context, in order.
+        An unexpected error is returned in place of its explanation instead of being raised.
+    """
+    cache_keys = [explanation_cache_key(context) for context in anomaly_contexts]
+    unique_contexts: Dict[Tuple, Dict[str, Any]] = {}
+    for key, context in zip(cache_keys, anomaly_contexts):
+        unique_contexts.setdefault(key, context)
+
+    unique_results = await asyncio.gather(
+        *(generate_explanation_with_llm(context) for context in unique_contexts.values()),
+        return_exceptions=True,
+    )
+    results_by_key = dict(zip(unique_contexts.keys(), unique_results))
+    return [results_by_key[key] for key in cache_keys]
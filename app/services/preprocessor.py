@@ -1,9 +1,72 @@
+import csv
 import pandas as pd
-from typing import IO
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from typing import IO, List
 import numpy as np
 
 # Import the centralized configuration for the feature list
-from app.core.config import FEATURES, MODEL_CONFIGS
+from app.core.config import FEATURES, MODEL_CONFIGS, LOG_TIMESTAMP_FORMAT
+
+# --- CSV Parsing Options ---
+# Synthetic logs are parsed by Arrow's multi-threaded CSV reader straight into float32
+# features (the precision the model scores in). Timestamps are read as strings and parsed
+# by pandas, which accepts more layouts (UTC offsets, 'MM/DD/YYYY ...') than Arrow's parser.
+CSV_BLOCK_SIZE = 8 << 20
+SYNTHETIC_COLUMN_TYPES = {feature: pa.float32() for feature in FEATURES}
+SYNTHETIC_COLUMN_TYPES['timestamp'] = pa.string()
+
+# --- Telematics Variable Mapping ---
+# The 'variable' column in the raw data corresponds to the feature names
+# but with spaces and different casing. We create a mapping once at import.
+# e.g., 'Vehicle Speed' -> 'vehicle_speed'
+TELEMATICS_FEATURES = MODEL_CONFIGS['telematics']['features']
+VARIABLE_MAP = {" ".join(word.capitalize() for word in f.split('_')): f for f in TELEMATICS_FEATURES}
+# The raw data has some inconsistencies in naming, so we add them manually
+VARIABLE_MAP['Vehicle speed'] = 'vehicle_speed'
+VARIABLE_MAP['ENGINE RPM'] = 'engine_rpm'
+VARIABLE_MAP['ENGINE COOLANT TEMPERATURE'] = 'engine_coolant_temperature'
+VARIABLE_MAP['THROTTLE POSITION'] = 'throttle_position'
+VARIABLE_MAP['INTAKE MANIFOLD ABSOLUTE PRESSURE'] = 'intake_manifold_absolute_pressure'
+VARIABLE_MAP['AIR INTAKE TEMPERATURE'] = 'air_intake_temperature'
+VARIABLE_MAP['CONTROL MODULE VOLTAGE'] = 'control_module_voltage'
+VARIABLE_MAP['CALCULATED ENGINE LOAD'] = 'calculated_engine_load'
+
+# Columns of the raw long-format export that the preprocessing uses.
+TELEMATICS_RAW_COLUMNS = ['timestamp', 'variable', 'value']
+
+RAW_VARIABLE_DTYPE = pd.CategoricalDtype(list(VARIABLE_MAP.keys()))
+TELEMATICS_FEATURE_DTYPE = pd.CategoricalDtype(TELEMATICS_FEATURES)
+# Category code of each raw name -> category code of its feature name.
+_FEATURE_CODES = np.array([TELEMATICS_FEATURES.index(f) for f in VARIABLE_MAP.values()], dtype=np.int8)
+
+def _read_csv_header(file: IO) -> List[str]:
+    """
+    Reads the column names from the first line of a CSV file-like object and
+    rewinds it, so the file can still be handed to pandas afterwards.
+    """
+    start = file.tell()
+    first_line = file.readline()
+    file.seek(start)
+
+    if isinstance(first_line, bytes):
+        first_line = first_line.decode("utf-8-sig", errors="replace")
+    return [col.strip() for col in next(csv.reader([first_line]), [])]
+
+def _parse_timestamps(timestamps: pd.Series, errors: str = "raise") -> pd.Series:
+    """
+    Parses a column of timestamp strings, using the fast LOG_TIMESTAMP_FORMAT parser for
+    the usual ISO-8601 logs and pandas' format inference for anything else.
+
+    Args:
+        timestamps (pd.Series): The raw timestamp column.
+        errors (str): How the inference fallback treats unparseable values ('raise' or
+            'coerce' to NaT), as in `pd.to_datetime`.
+    """
+    try:
+        return pd.to_datetime(timestamps, format=LOG_TIMESTAMP_FORMAT)
+    except ValueError:
+        return pd.to_datetime(timestamps, errors=errors)
 
 def load_and_prepare_data(file: IO) -> pd.DataFrame:
     """
@@ -19,24 +82,35 @@ def load_and_prepare_data(file: IO) -> pd.DataFrame:
     Raises:
         ValueError: If the file is not a valid CSV or is missing required columns.
     """
-    try:
-        df = pd.read_csv(file)
-    except Exception as e:
-        raise ValueError(f"Failed to parse CSV file: {e}")
-
     required_columns = FEATURES + ['timestamp']
-    if not all(col in df.columns for col in required_columns):
-        missing = [col for col in required_columns if col not in df.columns]
+
+    # Validate the header up front so only the required columns need to be decoded.
+    header = _read_csv_header(file)
+    if not all(col in header for col in required_columns):
+        missing = [col for col in required_columns if col not in header]
         raise ValueError(f"Uploaded log file is missing required columns for synthetic model: {missing}")
 
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    try:
+        table = pacsv.read_csv(
+            file,
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+            convert_options=pacsv.ConvertOptions(
+                column_types=SYNTHETIC_COLUMN_TYPES,
+                include_columns=required_columns,
+            ),
+        )
+        df = table.to_pandas()
+    except Exception as e:
+        raise ValueError(f"Failed to parse CSV file: {e}")
 
-    for col in FEATURES:
-        if df[col].isnull().any():
-            df[col] = df[col].ffill().bfill()
+    df['timestamp'] = _parse_timestamps(df['timestamp'])
 
-    if df[FEATURES].isnull().sum().any():
-        raise ValueError("Could not resolve all missing values in the feature columns.")
+    # Fill gaps across all feature columns in one block operation; clean files skip it.
+    if df[FEATURES].isna().to_numpy().any():
+        filled = df[FEATURES].ffill().bfill()
+        if filled.isna().to_numpy().any():
+            raise ValueError("Could not resolve all missing values in the feature columns.")
+        df[FEATURES] = filled
 
     return df
 
@@ -46,7 +120,9 @@ def load_telematics_data(file: IO) -> pd.DataFrame:
     Used for 'telematics' data which requires significant preprocessing.
     """
     try:
-        return pd.read_csv(file)
+        # Only the long-format columns are parsed; the repetitive variable names are
+        # decoded straight into categorical codes.
+        return pd.read_csv(file, engine="pyarrow", usecols=TELEMATICS_RAW_COLUMNS, dtype={'variable': 'category'})
     except Exception as e:
         raise ValueError(f"Failed to parse CSV file: {e}")
 
@@ -55,49 +131,39 @@ def preprocess_telematics_data(df: pd.DataFrame) -> pd.DataFrame:
     Transforms raw, long-format telematics data into a clean, wide-format
     DataFrame ready for the 'telematics' model.
     """
-    telematics_features = MODEL_CONFIGS['telematics']['features']
-    
-    # The 'variable' column in the raw data corresponds to the feature names
-    # but with spaces and different casing. We create a mapping.
-    # e.g., 'Vehicle speed' -> 'vehicle_speed'
-    variable_map = { " ".join(word.capitalize() for word in f.split('_')): f for f in telematics_features}
-    # The raw data has some inconsistencies in naming, so we add them manually
-    variable_map['ENGINE RPM'] = 'engine_rpm'
-    variable_map['ENGINE COOLANT TEMPERATURE'] = 'engine_coolant_temperature'
-    variable_map['THROTTLE POSITION'] = 'throttle_position'
-    variable_map['INTAKE MANIFOLD ABSOLUTE PRESSURE'] = 'intake_manifold_absolute_pressure'
-    variable_map['AIR INTAKE TEMPERATURE'] = 'air_intake_temperature'
-    variable_map['CONTROL MODULE VOLTAGE'] = 'control_module_voltage'
-    variable_map['CALCULATED ENGINE LOAD'] = 'calculated_engine_load'
-
-
-    selected_variables = list(variable_map.keys())
-
-    df_filtered = df[df['variable'].isin(selected_variables)].copy()
+    # Casting to the known raw names turns the filter into an integer code comparison;
+    # unknown variables get code -1. The codes are then remapped to the model's feature
+    # names, so the columns need no renaming after the pivot.
+    variable_codes = df['variable'].astype(RAW_VARIABLE_DTYPE).cat.codes.to_numpy()
+    selected = variable_codes >= 0
+
+    df_filtered = df.loc[selected, ['timestamp', 'value']].copy()
+    df_filtered['variable'] = pd.Categorical.from_codes(
+        _FEATURE_CODES[variable_codes[selected]],
+        dtype=TELEMATICS_FEATURE_DTYPE,
+    )
 
-    df_filtered['timestamp'] = pd.to_datetime(df_filtered['timestamp'], errors='coerce')
+    df_filtered['timestamp'] = _parse_timestamps(df_filtered['timestamp'], errors='coerce')
     df_filtered['value'] = pd.to_numeric(df_filtered['value'], errors='coerce')
     df_filtered.dropna(subset=['timestamp', 'value'], inplace=True)
 
     if df_filtered.empty:
         raise ValueError("The uploaded file contains no usable data for the selected telematics features.")
 
-    df_pivot = df_filtered.pivot_table(
-        index='timestamp',
-        columns='variable',
-        values='value',
-        aggfunc='mean'
-    )
+    # Average the readings of each variable per whole second in a single aggregation, then
+    # spread the variables into columns. This replaces a pivot on the raw timestamps followed
+    # by a second mean when resampling, and never builds the sparse intermediate frame.
+    seconds = df_filtered['timestamp'].dt.floor('s')
+    df_grouped = df_filtered.groupby([seconds, 'variable'], sort=True, observed=True)['value'].mean().unstack('variable')
+    df_grouped.columns = df_grouped.columns.astype(str)
 
-    df_resampled = df_pivot.resample('1S').mean()
-    df_interpolated = df_resampled.ffill().bfill()
+    # Reindex onto a uniform 1-second grid and fill the seconds without readings.
+    grid = pd.date_range(df_grouped.index[0], df_grouped.index[-1], freq='s', name='timestamp')
+    df_final = df_grouped.reindex(grid).ffill().bfill()
 
-    # Rename columns to match the feature names expected by the model
-    df_final = df_interpolated.rename(columns=variable_map)
-    
     # Ensure all required columns are present after processing
-    if not all(f in df_final.columns for f in telematics_features):
-        missing = [f for f in telematics_features if f not in df_final.columns]
+    if not all(f in df_final.columns for f in TELEMATICS_FEATURES):
+        missing = [f for f in TELEMATICS_FEATURES if f not in df_final.columns]
         raise ValueError(f"Preprocessing failed to create all required features. Missing: {missing}")
 
 
@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 import pandas as pd
 import io
+import time
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -12,6 +13,54 @@ st.set_page_config(
 
 # --- Backend API Configuration ---
 BACKEND_URL = "http://127.0.0.1:8000/api/v1/analyze/"
+REPORTS_URL = "http://127.0.0.1:8000/api/v1/reports/"
+# While LLM explanations are still being generated, the report is re-fetched at this interval,
+# up to REPORT_MAX_POLLS times (about two minutes) before the rule-based report is kept.
+REPORT_POLL_SECONDS = 2
+REPORT_MAX_POLLS = 60
+
+# --- API Request ---
+# Streamlit reruns the whole script on every widget interaction. The report is cached per
+# uploaded file and model, so expanding an anomaly or re-selecting a model that was already
+# used does not upload and re-analyze the file. Failed requests raise and are not cached.
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def analyze_log(file_id: str, model_name: str, _uploaded_file) -> dict:
+    """
+    Posts the log file to the analysis backend and returns the report.
+
+    Args:
+        file_id (str): Streamlit's ID of the uploaded file; part of the cache key.
+        model_name (str): The model to analyze with; part of the cache key.
+        _uploaded_file: The uploaded file. The leading underscore excludes it from hashing.
+
+    Returns:
+        dict: The analysis report returned by the backend.
+    """
+    # Pass the uploaded file object itself so requests reads it directly,
+    # instead of first copying the whole CSV into a bytes object.
+    _uploaded_file.seek(0)
+    files = {'file': (_uploaded_file.name, _uploaded_file, 'text/csv')}
+
+    # Append the selected model name as a query parameter. Explanations are deferred so the
+    # detected anomalies can be shown before the LLM has explained them.
+    analysis_url = f"{BACKEND_URL}?model_name={model_name}&defer_explanations=true"
+
+    response = requests.post(analysis_url, files=files, timeout=120)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_report(report_id: str):
+    """
+    Fetches the latest version of a report whose explanations were deferred.
+
+    Returns:
+        dict: The report, or None if the backend no longer has it.
+    """
+    response = requests.get(f"{REPORTS_URL}{report_id}", timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
 
 # --- UI Components ---
 st.title("🚗 Smart Vehicle Log Analyzer")
@@ -42,56 +91,79 @@ if uploaded_file is not None:
     # --- API Request ---
     with st.spinner("Sending data to the analysis engine..."):
         try:
-            files = {'file': (uploaded_file.name, uploaded_file.getvalue(), 'text/csv')}
-            
-            # Append the selected model name as a query parameter
-            analysis_url = f"{BACKEND_URL}?model_name={model_choice}"
-            
-            response = requests.post(analysis_url, files=files, timeout=120)
+            report = analyze_log(uploaded_file.file_id, model_choice, uploaded_file)
+            explaining = False
+            notice = None
+            if report.get('status') == "EXPLAINING":
+                # The finished report is kept in the session, so later reruns do not fetch it again.
+                finished_key = f"report_finished_{report['report_id']}"
+                # Count the polls per report across reruns, so polling stops eventually.
+                poll_key = f"report_polls_{report['report_id']}"
+                polls = st.session_state.get(poll_key, 0)
 
-            # --- Response Handling ---
-            if response.status_code == 200:
-                st.success("Analysis complete!")
-                report = response.json()
-
-                # --- Display Report ---
-                st.header("Analysis Report")
-                
-                col1, col2 = st.columns(2)
-                col1.metric("File Analyzed", report.get('file_id', 'N/A'))
-                col2.metric("Total Anomalies Detected", report.get('anomaly_count', 0))
-
-                st.subheader("Detected Anomalies")
-                if not report['anomalies']:
-                    st.write("✅ No anomalies were detected in this log file.")
+                latest_report = st.session_state.get(finished_key) or fetch_report(report['report_id'])
+                if latest_report is None:
+                    # The backend evicted the report, restarted, or another worker answered.
+                    notice = "AI explanations are no longer available for this report. Showing the rule-based explanations."
                 else:
-                    for i, anomaly in enumerate(report['anomalies']):
-                        severity = anomaly['severity']
-                        severity_normalized = severity.upper()
-                        color = "red" if severity_normalized == "HIGH" else "orange" if severity_normalized == "MEDIUM" else "blue"
-                        
-                        with st.expander(f"🚨 **{severity_normalized} Anomaly** at `{anomaly['timestamp']}`", expanded=i < 3):
-                            root_cause = anomaly.get('root_cause') or anomaly.get('explanation')
-                            st.markdown("**Explanation:**")
-                            st.warning(f"{root_cause}")
-                            
-                            actions = anomaly.get('recommended_actions') or []
-                            if actions:
-                                st.markdown("**Recommended Actions:**")
-                                for action in actions:
-                                    st.write(f"- {action}")
-                            
-                            st.markdown("**Contributing Signal Values:**")
-                            signals_df = pd.DataFrame([anomaly['contributing_signals']])
-                            st.dataframe(signals_df)
+                    report = latest_report
+                    explaining = report.get('status') == "EXPLAINING"
+                    if explaining and polls >= REPORT_MAX_POLLS:
+                        explaining = False
+                        notice = "AI explanations are taking too long. Showing the rule-based explanations."
+                    elif not explaining:
+                        st.session_state[finished_key] = report
+                st.session_state[poll_key] = polls + 1
+
+            if explaining:
+                st.info("Anomalies detected. Generating AI explanations; rule-based explanations are shown until they are ready...")
+            elif notice:
+                st.warning(notice)
+            else:
+                st.success("Analysis complete!")
+
+            # --- Display Report ---
+            st.header("Analysis Report")
+            
+            col1, col2 = st.columns(2)
+            col1.metric("File Analyzed", report.get('file_id', 'N/A'))
+            col2.metric("Total Anomalies Detected", report.get('anomaly_count', 0))
 
+            st.subheader("Detected Anomalies")
+            if not report['anomalies']:
+                st.write("✅ No anomalies were detected in this log file.")
             else:
-                st.error(f"Analysis failed (Code: {response.status_code}).")
-                try:
-                    error_detail = response.json().get('detail', 'No details provided.')
-                    st.error(f"Details: {error_detail}")
-                except requests.exceptions.JSONDecodeError:
-                    st.error("Could not decode server error response.")
+                for i, anomaly in enumerate(report['anomalies']):
+                    severity = anomaly['severity']
+                    severity_normalized = severity.upper()
+                    color = "red" if severity_normalized == "HIGH" else "orange" if severity_normalized == "MEDIUM" else "blue"
+                    
+                    with st.expander(f"🚨 **{severity_normalized} Anomaly** at `{anomaly['timestamp']}`", expanded=i < 3):
+                        root_cause = anomaly.get('root_cause') or anomaly.get('explanation')
+                        st.markdown("**Explanation:**")
+                        st.warning(f"{root_cause}")
+                        
+                        actions = anomaly.get('recommended_actions') or []
+                        if actions:
+                            st.markdown("**Recommended Actions:**")
+                            for action in actions:
+                                st.write(f"- {action}")
+                        
+                        st.markdown("**Contributing Signal Values:**")
+                        signals_df = pd.DataFrame([anomaly['contributing_signals']])
+                        st.dataframe(signals_df)
+
+            if explaining:
+                time.sleep(REPORT_POLL_SECONDS)
+                st.rerun()
+
+        except requests.exceptions.HTTPError as e:
+            st.error(f"Analysis failed (Code: {e.response.status_code}).")
+            try:
+                error_detail = e.response.json().get('detail', 'No details provided.')
+                st.error(f"Details: {error_detail}")
+            except requests.exceptions.JSONDecodeError:
+                st.error("Could not decode server error response.")
 
         except requests.exceptions.RequestException as e:
             st.error(f"Network error: Could not connect to the backend at `{BACKEND_URL}`.")
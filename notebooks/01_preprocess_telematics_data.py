@@ -2,6 +2,7 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import sys
 
 # --- Configuration ---
 # Select a subset of variables to act as our core features.
@@ -17,25 +18,39 @@ SELECTED_VARIABLES = [
     'CALCULATED ENGINE LOAD',
 ]
 
+# Columns of the raw long-format export that the preprocessing uses.
+RAW_COLUMNS = ['timestamp', 'variable', 'value']
+
 # --- Path Setup ---
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from app.core.config import LOG_TIMESTAMP_FORMAT
 DATA_DIR = PROJECT_ROOT / "data"
 INPUT_PATH = DATA_DIR / "Telematicsdata.csv"
-OUTPUT_PATH = DATA_DIR / "processed_telematics_data.csv"
+OUTPUT_PATH = DATA_DIR / "processed_telematics_data.parquet"
 
 # --- Main Preprocessing Logic ---
 if __name__ == "__main__":
     print(f"Loading raw data from {INPUT_PATH}...")
     try:
-        df = pd.read_csv(INPUT_PATH)
+        # Only the three long-format columns are parsed, and the repetitive 'variable'
+        # names are stored as categorical codes instead of one string per row.
+        df = pd.read_csv(
+            INPUT_PATH,
+            engine='pyarrow',
+            usecols=RAW_COLUMNS,
+            dtype={'variable': 'category'},
+        )
 
         # --- 1. Initial Filtering and Cleaning ---
         print("Filtering for selected variables...")
         df_filtered = df[df['variable'].isin(SELECTED_VARIABLES)].copy()
 
         # Convert 'timestamp' to datetime objects for time-series analysis
-        df_filtered['timestamp'] = pd.to_datetime(df_filtered['timestamp'], errors='coerce')
+        # The raw timestamps are ISO-8601, so an explicit format avoids per-row format inference.
+        df_filtered['timestamp'] = pd.to_datetime(df_filtered['timestamp'], format=LOG_TIMESTAMP_FORMAT, errors='coerce')
 
         # Convert 'value' to numeric, coercing non-numeric values to NaN (Not a Number)
         df_filtered['value'] = pd.to_numeric(df_filtered['value'], errors='coerce')
@@ -45,26 +60,22 @@ if __name__ == "__main__":
 
         print(f"Filtered data has {len(df_filtered)} rows.")
 
-        # --- 2. Pivot Data from Long to Wide Format ---
-        print("Pivoting data to wide format...")
-        # We use a pivot table to turn unique 'variable' names into columns.
-        # The index is the timestamp, and values are the sensor readings.
-        df_pivot = df_filtered.pivot_table(
-            index='timestamp',
-            columns='variable',
-            values='value',
-            aggfunc='mean' # Use mean to handle multiple readings in the same timestamp
-        )
+        # --- 2. Aggregate to 1-Second Bins and Pivot to Wide Format ---
+        print("Aggregating readings per second and pivoting to wide format...")
+        # The raw timestamps are irregular, so each reading is assigned to its whole second.
+        # A single groupby averages all readings of a variable within the same second, and
+        # unstack turns the unique 'variable' names into columns.
+        seconds = df_filtered['timestamp'].dt.floor('s')
+        df_grouped = df_filtered.groupby([seconds, 'variable'], sort=True, observed=True)['value'].mean().unstack('variable')
 
-        print(f"Pivot table created with {len(df_pivot)} rows.")
+        print(f"Aggregated data has {len(df_grouped)} populated seconds.")
 
         # --- 3. Resample and Interpolate ---
-        # The pivot table will have irregular time intervals. We need to create a uniform time index.
+        # Reindex onto a uniform time index with one row per second, so seconds without
+        # any reading become empty (NaN) rows.
         print("Resampling data to a consistent 1-second frequency...")
-        
-        # Resample the data to have one row per second.
-        # Use 'mean()' to aggregate any data points that fall into the same second.
-        df_resampled = df_pivot.resample('1S').mean()
+        grid = pd.date_range(df_grouped.index[0], df_grouped.index[-1], freq='s', name='timestamp')
+        df_resampled = df_grouped.reindex(grid)
 
         print(f"Resampled data has {len(df_resampled)} rows.")
         
@@ -85,7 +96,8 @@ if __name__ == "__main__":
         df_final = df_interpolated.reset_index()
 
         print(f"Saving processed data to {OUTPUT_PATH}...")
-        df_final.to_csv(OUTPUT_PATH, index=False)
+        # Parquet keeps the column types and loads much faster than re-parsing a CSV.
+        df_final.to_parquet(OUTPUT_PATH, engine='pyarrow', compression='snappy', index=False)
 
         print("\nPreprocessing complete.")
         print("\n--- Processed Data Sample ---")
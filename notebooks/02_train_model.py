@@ -1,4 +1,5 @@
 # --- 0. Imports ---
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
@@ -45,7 +46,8 @@ MODEL_PARAMS = {
 # --- 3. Data Loading and Preparation ---
 print("Loading training data...")
 try:
-    df = pd.read_csv(DATA_PATH)
+    # Features are read as float32, the precision the model is trained and served in.
+    df = pd.read_csv(DATA_PATH, dtype={feature: np.float32 for feature in FEATURES})
     print(f"Data loaded successfully. Shape: {df.shape}")
 except FileNotFoundError:
     print(f"Error: Training data not found at {DATA_PATH}")
@@ -53,19 +55,23 @@ except FileNotFoundError:
     sys.exit(1)
 
 # Select features for training
-X = df[FEATURES]
+# The columns are already float32, so this extracts them without a dtype conversion.
+X = df[FEATURES].to_numpy(dtype=np.float32, copy=False)
 
 # Handle potential missing values (though our synthetic data is clean)
-if X.isnull().sum().any():
+if np.isnan(X).any():
     print("Missing values detected. Filling with the mean.")
-    X = X.fillna(X.mean())
+    X = np.where(np.isnan(X), np.nanmean(X, axis=0), X).astype(np.float32)
 
 
 # --- 4. Feature Scaling ---
 # Scaling is crucial for anomaly detection algorithms that are sensitive to feature ranges.
 print("Scaling features...")
 scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+# X is only used for training, so it is standardized in place and stays float32.
+# The scaler's statistics stay in float64 so the scaler can be folded into the trees
+# exactly at inference time.
+X_scaled = scaler.fit(X).transform(X, copy=False)
 print("Features scaled successfully.")
 
 
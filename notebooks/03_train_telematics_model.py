@@ -1,4 +1,5 @@
 # --- 0. Imports ---
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
@@ -11,7 +12,7 @@ SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 sys.path.append(str(PROJECT_ROOT))
 
-DATA_PATH = PROJECT_ROOT / "data" / "processed_telematics_data.csv"
+DATA_PATH = PROJECT_ROOT / "data" / "processed_telematics_data.parquet"
 MODEL_OUTPUT_DIR = PROJECT_ROOT / "app" / "ml"
 MODEL_OUTPUT_DIR.mkdir(exist_ok=True)
 
@@ -44,7 +45,9 @@ MODEL_PARAMS = {
 # --- 3. Data Loading and Preparation ---
 print("Loading training data...")
 try:
-    df = pd.read_csv(DATA_PATH)
+    # Only the feature columns are read from the Parquet file ('timestamp' is skipped),
+    # as float32, the precision the model is trained and served in.
+    df = pd.read_parquet(DATA_PATH, columns=FEATURES, engine='pyarrow').astype(np.float32)
     print(f"Data loaded successfully. Shape: {df.shape}")
 except FileNotFoundError:
     print(f"Error: Training data not found at {DATA_PATH}")
@@ -53,16 +56,20 @@ except FileNotFoundError:
 
 # Select features for training
 # The 'timestamp' column is excluded as it's not a feature for the model.
-X = df[FEATURES]
+# The columns are already float32, so this extracts them without a dtype conversion.
+X = df[FEATURES].to_numpy(dtype=np.float32, copy=False)
 
-if X.isnull().sum().any():
+if np.isnan(X).any():
     print("Missing values detected. Filling with the mean.")
-    X = X.fillna(X.mean())
+    X = np.where(np.isnan(X), np.nanmean(X, axis=0), X).astype(np.float32)
 
 # --- 4. Feature Scaling ---
 print("Scaling features...")
 scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+# X is only used for training, so it is standardized in place and stays float32.
+# The scaler's statistics stay in float64 so the scaler can be folded into the trees
+# exactly at inference time.
+X_scaled = scaler.fit(X).transform(X, copy=False)
 print("Features scaled successfully.")
 
 # --- 5. Model Training ---
@@ -1,12 +1,27 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 # --- Configuration ---
 N_SAMPLES_NORMAL = 5000
 N_SAMPLES_MIXED = 2000
 
+# Root seed for the random number generators, so the generated datasets are reproducible.
+# Every dataset and every generation block gets its own child of this seed through
+# `np.random.SeedSequence.spawn`, which keeps their streams independent.
+RANDOM_SEED = 42
+
+# Datasets larger than this many samples are generated in blocks across worker processes.
+GENERATION_CHUNK_SIZE = 1_000_000
+
+# Floating-point type of the generated signals. The model is trained and scored in float32,
+# and the signal ranges (0-200 km/h, 70-120 C, ~12 V) need nothing wider.
+SIGNAL_DTYPE = np.float32
+
 # --- Path Setup ---
 # Make paths robust by defining them relative to the script's location
 # This ensures the script can be run from anywhere
@@ -25,92 +40,238 @@ SPEED_NORMAL = (0, 120)
 VOLTAGE_NORMAL = (12.2, 14.4)
 BRAKE_NORMAL = (0, 20) # Normal, light braking
 
+# Driving Phases
+# Phases are encoded as integer codes; each has a probability and a base speed range.
+PHASE_IDLE, PHASE_CITY, PHASE_HIGHWAY = 0, 1, 2
+PHASE_PROBABILITIES = [0.2, 0.5, 0.3]
+PHASE_SPEED_LOW = np.array([0.0, 10.0, 80.0])
+PHASE_SPEED_HIGH = np.array([1.0, 60.0, 120.0])
+
 # --- Function to Generate Base Data ---
-def generate_base_data(n_samples):
-    """Generates a base DataFrame with realistic signal correlations."""
-    data = pd.DataFrame()
-    
-    # Create a time index
-    now = datetime.now()
-    data['timestamp'] = [now + timedelta(seconds=i) for i in range(n_samples)]
-    
+def draw_uniform(rng, low, high, size, dtype):
+    """
+    Draws uniform samples in [low, high) directly in `dtype`.
+
+    `Generator.uniform` always returns float64, so this scales `Generator.random`,
+    which can fill a float32 buffer without a conversion pass.
+    """
+    values = rng.random(size, dtype=dtype)
+    values *= high - low
+    values += low
+    return values
+
+def generate_signal_chunk(n_samples, seed, dtype=SIGNAL_DTYPE):
+    """
+    Generates the raw signals for a contiguous block of samples.
+
+    Every signal except the engine temperature only depends on its own sample, so blocks
+    can be generated independently. For the temperature, only the per-step changes
+    ('temp_delta') and the sensor noise ('temp_noise') are drawn here; the running sum
+    over all blocks is taken by `generate_base_data`.
+
+    Args:
+        n_samples (int): Number of samples in the block.
+        seed: A seed, `np.random.SeedSequence` or `np.random.Generator` to draw from.
+        dtype: Floating-point type of the returned signals. The temperature steps stay float64
+            because they are summed over the whole dataset.
+
+    Returns:
+        dict: The block's signal arrays, keyed by name.
+    """
+    rng = np.random.default_rng(seed)
+    signals = {}
+
     # Simulate different driving phases
-    phases = np.random.choice(['idle', 'city', 'highway'], n_samples, p=[0.2, 0.5, 0.3])
+    phases = rng.choice(3, n_samples, p=PHASE_PROBABILITIES)
     
     # --- Generate Signals based on Phases ---
     # Vehicle Speed
-    speed = np.zeros(n_samples)
-    speed[phases == 'idle'] = np.random.uniform(0, 1, size=(phases == 'idle').sum())
-    speed[phases == 'city'] = np.random.uniform(10, 60, size=(phases == 'city').sum())
-    speed[phases == 'highway'] = np.random.uniform(80, 120, size=(phases == 'highway').sum())
-    data['vehicle_speed'] = np.clip(speed + np.random.normal(0, 2, n_samples), 0, 200)
+    # Each sample is drawn from its phase's speed range in a single call.
+    speed = draw_uniform(rng, PHASE_SPEED_LOW[phases], PHASE_SPEED_HIGH[phases], n_samples, dtype)
+    # The measured speed is built in the noise buffer, so `speed` stays clean for the
+    # phase-dependent signals below and no temporaries are allocated.
+    vehicle_speed = rng.standard_normal(n_samples, dtype=dtype)
+    vehicle_speed *= 2
+    vehicle_speed += speed
+    signals['vehicle_speed'] = np.clip(vehicle_speed, 0, 200, out=vehicle_speed)
 
     # Engine Temperature (correlates with speed, but with lag)
-    temp = np.full(n_samples, 80.0)
-    for i in range(1, n_samples):
-        if speed[i] > 60:
-            temp[i] = temp[i-1] + np.random.uniform(0.1, 0.5) # Heats up on highway
-        elif speed[i] < 10:
-            temp[i] = temp[i-1] - np.random.uniform(0.05, 0.2) # Cools down at idle
-        else:
-            temp[i] = temp[i-1] + np.random.uniform(-0.1, 0.1) # Stable in city
-    data['engine_temp'] = np.clip(temp + np.random.normal(0, 1, n_samples), 70, 120)
+    # Every step changes the temperature depending on the current speed.
+    heating = speed > 60
+    cooling = speed < 10
+    stable = ~(heating | cooling)
+    delta = np.empty(n_samples)
+    delta[heating] = rng.uniform(0.1, 0.5, size=heating.sum()) # Heats up on highway
+    delta[cooling] = -rng.uniform(0.05, 0.2, size=cooling.sum()) # Cools down at idle
+    delta[stable] = rng.uniform(-0.1, 0.1, size=stable.sum()) # Stable in city
+    signals['temp_delta'] = delta
+    signals['temp_noise'] = rng.normal(0, 1, n_samples)
 
     # Battery Voltage
-    voltage = np.random.uniform(VOLTAGE_NORMAL[0], VOLTAGE_NORMAL[1], n_samples)
-    # Slight drop when speed is high
-    voltage[speed > 80] -= np.random.uniform(0.1, 0.3)
-    data['battery_voltage'] = np.clip(voltage, 11.5, 14.8)
+    voltage = draw_uniform(rng, VOLTAGE_NORMAL[0], VOLTAGE_NORMAL[1], n_samples, dtype)
+    # Slight drop when speed is high, drawn separately for every fast sample
+    fast = speed > 80
+    voltage[fast] -= rng.uniform(0.1, 0.3, size=fast.sum())
+    signals['battery_voltage'] = np.clip(voltage, 11.5, 14.8, out=voltage)
 
     # Brake Pressure
-    brake = np.zeros(n_samples)
-    brake[phases == 'city'] = np.random.exponential(scale=5, size=(phases == 'city').sum())
-    data['brake_pressure'] = np.clip(brake, 0, 100)
-    
+    # Braking only happens in the city: every sample gets a draw, and the others are zeroed.
+    brake = rng.standard_exponential(n_samples, dtype=dtype)
+    brake *= 5
+    brake *= phases == PHASE_CITY
+    signals['brake_pressure'] = np.clip(brake, 0, 100, out=brake)
+
+    return signals
+
+def generate_base_data(n_samples, rng, dtype=SIGNAL_DTYPE):
+    """
+    Generates a base DataFrame with realistic signal correlations, drawing from `rng`.
+
+    Large datasets are generated in blocks of GENERATION_CHUNK_SIZE samples across worker
+    processes, each block with its own child seed spawned from `rng`'s seed sequence.
+    All signal columns are generated as `dtype`.
+    """
+    # Create a time index
+    # One sample per second, built directly as a datetime64 column.
+    timestamps = pd.date_range(start=datetime.now(), periods=n_samples, freq='s')
+
+    if n_samples <= GENERATION_CHUNK_SIZE:
+        chunks = [generate_signal_chunk(n_samples, rng, dtype)]
+    else:
+        chunk_sizes = [GENERATION_CHUNK_SIZE] * (n_samples // GENERATION_CHUNK_SIZE)
+        if n_samples % GENERATION_CHUNK_SIZE:
+            chunk_sizes.append(n_samples % GENERATION_CHUNK_SIZE)
+        chunk_seeds = rng.bit_generator.seed_seq.spawn(len(chunk_sizes))
+        with ProcessPoolExecutor() as executor:
+            chunks = list(executor.map(generate_signal_chunk, chunk_sizes, chunk_seeds, [dtype] * len(chunk_sizes)))
+
+    signals = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+    # Engine Temperature (correlates with speed, but with lag)
+    # The whole trajectory is the running sum of the per-step changes, starting from 80.
+    # This is the only serial step, so it runs once over all blocks.
+    delta = signals['temp_delta']
+    delta[0] = 80.0
+    temp = np.cumsum(delta, out=delta)
+    temp += signals['temp_noise']
+    engine_temp = np.clip(temp, 70, 120, out=temp).astype(dtype, copy=False)
+
     # Error Code (0 means no error)
-    data['error_code'] = 0
-    
-    return data
+    # The codes are small integers (0, 101, 202, 305), so int16 holds them in a quarter of the space.
+    error_code = np.zeros(n_samples, dtype=np.int16)
+
+    # The DataFrame is built once from the finished arrays, so pandas lays out its
+    # blocks a single time instead of growing the frame column by column.
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'vehicle_speed': signals['vehicle_speed'],
+        'engine_temp': engine_temp,
+        'battery_voltage': signals['battery_voltage'],
+        'brake_pressure': signals['brake_pressure'],
+        'error_code': error_code,
+    }, copy=False)
 
 # --- Function to Inject Anomalies ---
-def inject_anomalies(df):
-    """Injects specific, meaningful anomalies into the dataframe."""
-    df_anomalous = df.copy()
-    
+def select_anomaly_rows(mask, frac, order):
+    """
+    Returns the positions of a random `frac` share of the rows where `mask` is True.
+
+    `order` is a random permutation of all row positions shared by every anomaly type.
+    The rows matching `mask`, taken in that order, are a uniformly shuffled candidate
+    list, so its first `frac` share is a uniform sample without another shuffle.
+    """
+    candidates = order[mask[order]]
+    return candidates[:round(frac * len(candidates))]
+
+def set_rows(df, positions, column, values):
+    """
+    Writes `values` into `column` at the given row positions, cast to the column's dtype.
+
+    `.iloc` writes by position, skipping the label alignment `.loc` would do, and unlike
+    writing into a `to_numpy()` view it also works with pandas' copy-on-write mode (the
+    default from pandas 3). The cast keeps float32 columns from being upcast.
+    """
+    df.iloc[positions, df.columns.get_loc(column)] = np.asarray(values, dtype=df[column].dtype)
+
+def inject_anomalies(df, rng):
+    """
+    Injects specific, meaningful anomalies into the dataframe, drawing from `rng`.
+
+    The dataframe is modified in place (no copy is made) and returned for convenience.
+    """
+    # All three faults are keyed on speed, so the column is read once and shared.
+    speed = df['vehicle_speed'].to_numpy()
+    row_positions = np.arange(len(df))
+    # One shuffle of the rows serves all three selections.
+    order = rng.permutation(len(df))
+
     # Anomaly 1: Overheating at low speed (Thermostat Stuck)
     # High engine temp while vehicle speed is low.
-    anomaly_idx_1 = df_anomalous[(df_anomalous['vehicle_speed'] < 10) & (df_anomalous.index > 100)].sample(frac=0.1).index
-    df_anomalous.loc[anomaly_idx_1, 'engine_temp'] = np.random.uniform(105, 115, len(anomaly_idx_1))
-    df_anomalous.loc[anomaly_idx_1, 'error_code'] = 101 # Custom code for this fault
+    anomaly_idx_1 = select_anomaly_rows((speed < 10) & (row_positions > 100), 0.1, order)
+    set_rows(df, anomaly_idx_1, 'engine_temp', rng.uniform(105, 115, len(anomaly_idx_1)))
+    set_rows(df, anomaly_idx_1, 'error_code', 101) # Custom code for this fault
 
     # Anomaly 2: Alternator Failure
     # Battery voltage drops significantly, especially at speed.
-    anomaly_idx_2 = df_anomalous[df_anomalous['vehicle_speed'] > 40].sample(frac=0.05).index
-    df_anomalous.loc[anomaly_idx_2, 'battery_voltage'] = np.random.uniform(10.5, 11.8, len(anomaly_idx_2))
-    df_anomalous.loc[anomaly_idx_2, 'error_code'] = 202 # Custom code
+    anomaly_idx_2 = select_anomaly_rows(speed > 40, 0.05, order)
+    set_rows(df, anomaly_idx_2, 'battery_voltage', rng.uniform(10.5, 11.8, len(anomaly_idx_2)))
+    set_rows(df, anomaly_idx_2, 'error_code', 202) # Custom code
 
     # Anomaly 3: Brake System Fault
     # Brake pressure is high even when speed is high (unintended braking).
-    anomaly_idx_3 = df_anomalous[df_anomalous['vehicle_speed'] > 80].sample(frac=0.05).index
-    df_anomalous.loc[anomaly_idx_3, 'brake_pressure'] = np.random.uniform(50, 80, len(anomaly_idx_3))
-    df_anomalous.loc[anomaly_idx_3, 'error_code'] = 305 # Custom code
+    # Fast rows are also candidates for Anomaly 2, so they are taken from the other end
+    # of the shuffle and do not overwrite the alternator faults.
+    anomaly_idx_3 = select_anomaly_rows(speed > 80, 0.05, order[::-1])
+    set_rows(df, anomaly_idx_3, 'brake_pressure', rng.uniform(50, 80, len(anomaly_idx_3)))
+    set_rows(df, anomaly_idx_3, 'error_code', 305) # Custom code
     
-    return df_anomalous
+    return df
+
+# --- CSV Output ---
+def write_csv(df, path):
+    """
+    Writes the dataframe to `path` as CSV with Arrow's C++ writer, which formats the float
+    columns much faster than `DataFrame.to_csv`. The files stay CSV because the API and
+    the training notebooks read them as CSV.
+    """
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+
+# --- Dataset Tasks ---
+# The normal and mixed datasets are independent, so each is generated and written by its
+# own worker process with its own seeded generator. `seed` is anything accepted by
+# `np.random.default_rng`, normally a child `SeedSequence` of RANDOM_SEED.
+def generate_normal_dataset(seed):
+    """Generates the normal (training) dataset and writes it to OUTPUT_NORMAL_PATH."""
+    rng = np.random.default_rng(seed)
+    normal_data = generate_base_data(N_SAMPLES_NORMAL, rng)
+    write_csv(normal_data, OUTPUT_NORMAL_PATH)
+    print(f"Successfully generated {N_SAMPLES_NORMAL} normal samples at: {OUTPUT_NORMAL_PATH}")
+    return normal_data
+
+def generate_mixed_dataset(seed):
+    """Generates the mixed (normal + anomaly) dataset and writes it to OUTPUT_MIXED_PATH."""
+    rng = np.random.default_rng(seed)
+    mixed_data_base = generate_base_data(N_SAMPLES_MIXED, rng)
+    # inject_anomalies works in place, so the base frame is not kept around as a separate copy.
+    mixed_data_anomalous = inject_anomalies(mixed_data_base, rng)
+    write_csv(mixed_data_anomalous, OUTPUT_MIXED_PATH)
+    print(f"Successfully generated {N_SAMPLES_MIXED} mixed (normal + anomaly) samples at: {OUTPUT_MIXED_PATH}")
+    return mixed_data_anomalous
 
 # --- Main Generation Logic ---
 if __name__ == "__main__":
     print("Generating synthetic vehicle log data...")
-    
-    # 1. Generate Normal Data for Training
-    normal_data = generate_base_data(N_SAMPLES_NORMAL)
-    normal_data.to_csv(OUTPUT_NORMAL_PATH, index=False)
-    print(f"Successfully generated {N_SAMPLES_NORMAL} normal samples at: {OUTPUT_NORMAL_PATH}")
 
-    # 2. Generate Mixed Data for Testing/Inference
-    mixed_data_base = generate_base_data(N_SAMPLES_MIXED)
-    mixed_data_anomalous = inject_anomalies(mixed_data_base)
-    mixed_data_anomalous.to_csv(OUTPUT_MIXED_PATH, index=False)
-    print(f"Successfully generated {N_SAMPLES_MIXED} mixed (normal + anomaly) samples at: {OUTPUT_MIXED_PATH}")
+    normal_seed, mixed_seed = np.random.SeedSequence(RANDOM_SEED).spawn(2)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        # 1. Generate Normal Data for Training
+        normal_future = executor.submit(generate_normal_dataset, normal_seed)
+        # 2. Generate Mixed Data for Testing/Inference
+        mixed_future = executor.submit(generate_mixed_dataset, mixed_seed)
+
+        normal_data = normal_future.result()
+        mixed_data_anomalous = mixed_future.result()
     
     print("\nData generation complete.")
     print("\n--- Normal Data Sample ---")
@@ -0,0 +1,56 @@
+import json
+import warnings
+
+import numpy as np
+
+from app.api.models import AnalysisReport
+from app.services.analysis import _build_anomalies
+
+
+def _context(**overrides):
+    context = {
+        "sensor_values": {"engine_temp": 80.7, "vehicle_speed": 12.5},
+        "anomaly_score": -1.0,
+        "timestamp": "2024-01-01T00:00:00",
+        "feature_name": "engine_temp,vehicle_speed",
+        "rule_based_severity": "MEDIUM",
+        "rule_based_explanation": "Rule-based explanation.",
+    }
+    context.update(overrides)
+    return context
+
+
+def _report(anomalies):
+    return AnalysisReport.model_construct(
+        file_id="test.csv", status="COMPLETED", anomaly_count=len(anomalies), anomalies=anomalies
+    )
+
+
+def test_degenerate_inputs_still_produce_a_schema_valid_report():
+    contexts = [
+        # A missing timestamp and NumPy scalar signal values.
+        _context(timestamp=float("nan"), sensor_values={"engine_temp": np.float32(80.7), "vehicle_speed": np.int64(3)}),
+        # LLM output with the wrong types.
+        _context(),
+        # A failed LLM call.
+        _context(),
+    ]
+    llm_results = [
+        {},
+        {"root_cause": 42, "severity": None, "recommended_actions": "Check the thermostat."},
+        RuntimeError("LLM unavailable"),
+    ]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        payload = _report(_build_anomalies("test.csv", contexts, llm_results)).model_dump_json()
+
+    report = AnalysisReport.model_validate(json.loads(payload))
+    first, second, third = report.anomalies
+    assert first.timestamp == "nan"
+    assert first.contributing_signals == {"engine_temp": float(np.float32(80.7)), "vehicle_speed": 3.0}
+    assert second.root_cause == "42"
+    assert second.severity == "MEDIUM"
+    assert second.recommended_actions == ["Check the thermostat."]
+    assert third.explanation == "Rule-based explanation."
+    assert third.root_cause is None
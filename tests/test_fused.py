@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from app.ml.fused import fuse_scaler_into_forest
+
+
+def _fit(scaler, seed=0):
+    rng = np.random.default_rng(seed)
+    # Features on very different scales and offsets, like the vehicle signals.
+    X = rng.normal(loc=[90.0, 60.0, 13.0, 5.0], scale=[5.0, 30.0, 0.5, 8.0], size=(5000, 4))
+    model = IsolationForest(n_estimators=50, random_state=seed).fit(scaler.fit_transform(X))
+    return model, scaler, X
+
+
+@pytest.mark.parametrize(
+    "with_mean, with_std",
+    [(True, True), (False, True), (True, False), (False, False)],
+)
+def test_fused_forest_matches_scaler_and_forest(with_mean, with_std):
+    model, scaler, X = _fit(StandardScaler(with_mean=with_mean, with_std=with_std))
+
+    fused = fuse_scaler_into_forest(model, scaler)
+
+    assert fused is not None
+    np.testing.assert_array_equal(fused.predict(X), model.predict(scaler.transform(X)))
+
+
+def test_fusion_leaves_the_original_model_untouched():
+    model, scaler, X = _fit(StandardScaler())
+    expected = model.predict(scaler.transform(X))
+
+    fuse_scaler_into_forest(model, scaler)
+
+    np.testing.assert_array_equal(model.predict(scaler.transform(X)), expected)
+
+
+def test_unsupported_scaler_is_not_fused():
+    model, scaler, _ = _fit(MinMaxScaler())
+
+    assert fuse_scaler_into_forest(model, scaler) is None